@@ -1,66 +1,130 @@
-import collections
+from dataclasses import dataclass
+from typing import ClassVar
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 """An abstract syntax tree is the tree of actual semantic operations the program executes."""
 
-class IntegerLiteral(collections.namedtuple("IntegerLiteral", "value")):
+@dataclass(frozen=True, slots=True)
+class IntegerLiteral(object):
     """Represents an integer in the code."""
 
+    _TYPE: ClassVar[str] = "IntegerLiteral"
+
+    value: int
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "IntegerLiteral", "value": int(self.value)}
+        return {"type": self._TYPE, "value": int(self.value)}
 
-class NArgumentInstruction(collections.namedtuple("NArgumentInstruction", ("op", "args"))):
+@dataclass(frozen=True, slots=True)
+class NArgumentInstruction(object):
     """Represents a TIS-Py00 instruction with an arbitrary number of arguments."""
 
+    _TYPE: ClassVar[str] = "NArgumentInstruction"
+
+    # An Opcode from tis_helpers
+    op: int
+    args: tuple
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "NArgumentInstruction", "op": self.op, "args": [arg_node.to_dict() for arg_node in self.args]}
+        return {"type": self._TYPE, "op": self.op.name.lower(), "args": [arg_node.to_dict() for arg_node in self.args]}
 
-class NodeMarker(collections.namedtuple("NodeMarker", ("id", "ast_subtree"))):
+@dataclass(frozen=True, slots=True)
+class NodeMarker(object):
     """Represents the code that a single node has."""
 
+    _TYPE: ClassVar[str] = "NodeMarker"
+
+    id: int
+    ast_subtree: "SingleNodeAST"
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "NodeMarker", "id": int(self.id), "value": self.ast_subtree.to_dict()}
+        return {"type": self._TYPE, "id": int(self.id), "value": self.ast_subtree.to_dict()}
 
-class PortLiteral(collections.namedtuple("PortLiteral", "name")):
+@dataclass(frozen=True, slots=True)
+class PortLiteral(object):
     """Represents a port in an instruction."""
 
+    _TYPE: ClassVar[str] = "PortLiteral"
+
+    # A Port from tis_helpers
+    name: int
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "PortLiteral", "value": self.name}
+        return {"type": self._TYPE, "value": self.name.name}
 
-class RegisterLiteral(collections.namedtuple("RegisterLiteral", "name")):
+@dataclass(frozen=True, slots=True)
+class RegisterLiteral(object):
     """Represents a register in an instruction."""
 
+    _TYPE: ClassVar[str] = "RegisterLiteral"
+
+    name: str
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "RegisterLiteral", "value": self.name}
+        return {"type": self._TYPE, "value": self.name}
 
-class Label(collections.namedtuple("Label", "name")):
+@dataclass(frozen=True, slots=True)
+class Label(object):
     """Represents a label definition."""
 
+    _TYPE: ClassVar[str] = "Label"
+
+    name: str
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "Label", "value": self.name}
+        return {"type": self._TYPE, "value": self.name}
 
-class LabelReference(collections.namedtuple("LabelReference", "name")):
+@dataclass(frozen=True, slots=True)
+class LabelReference(object):
     """Represents a label reference."""
 
+    _TYPE: ClassVar[str] = "LabelReference"
+
+    name: str
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "LabelReference", "value": self.name}
+        return {"type": self._TYPE, "value": self.name}
 
-class SingleNodeAST(collections.namedtuple("SingleNodeAST", "ast")):
+@dataclass(frozen=True, slots=True)
+class SingleNodeAST(object):
     """Represents a single node and its code."""
 
+    _TYPE: ClassVar[str] = "SingleNodeAST"
+
+    ast: tuple
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "SingleNodeAST", "ast": [ast_node.to_dict() for ast_node in self.ast]}
+        return {"type": self._TYPE, "ast": [ast_node.to_dict() for ast_node in self.ast]}
 
-class ASTRoot(collections.namedtuple("ASTRoot", "nodes")):
+@dataclass(frozen=True, slots=True)
+class ASTRoot(object):
     """Represents a program with nodes and their code."""
 
+    _TYPE: ClassVar[str] = "ASTRoot"
+
+    # A read-only mapping of node ids to SingleNodeASTs
+    nodes: dict
+
     def to_dict(self):
         """We have a dictionary converting method to be able to convert this into json."""
-        return {"type": "ASTRoot", "nodes": {key: val.to_dict() for key, val in self.nodes.items()}}
\ No newline at end of file
+        return {"type": self._TYPE, "nodes": {key: val.to_dict() for key, val in self.nodes.items()}}
+
+
+def to_json(root: ASTRoot):
+    """Converts an ast root into a json string, with orjson if it's installed since it's a lot faster than json."""
+    if orjson is not None:
+        return orjson.dumps(root.to_dict(), option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(root.to_dict(), separators=(",", ":"))
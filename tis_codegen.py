@@ -0,0 +1,131 @@
+from tis_helpers import *
+
+"""Compiles the ast of a TIS node into a Python step function, so the instructions don't have to be interpreted on every step."""
+
+
+def _operand_expr(arg):
+    """Returns the Python expression for reading an instruction argument, or None if it isn't a literal or a register."""
+    arg_cls = arg.__class__
+    if arg_cls is IntegerLiteral:
+        return repr(arg.value)
+    elif arg_cls is RegisterLiteral:
+        return "accs[node._register_cursor]"
+    return None
+
+
+def _clamped(expr: str):
+    """Returns the Python statements that clamp expr into the value range and store it into acc."""
+    return ["value = " + expr,
+            "accs[node._register_cursor] = {0} if value < {0} else {1} if value > {1} else value".format(VALUE_MIN, VALUE_MAX)]
+
+
+def _instr_source(tis_node, inx: int, instr: NArgumentInstruction):
+    """Returns the lines of Python that execute the instruction at executable ast index inx of the node,
+    or None if the instruction has to be run by the interpreter.
+    That is the case for everything that reads or writes a port, a swt from acc out of range, and opcodes that aren't known here."""
+
+    # The instruction pointer after the instruction, this is what incr_instr_pointer does
+    next_inx = (inx + 1) % tis_node.ast_len
+    advance = ["node.instruction_pointer = {0}".format(next_inx)]
+
+    # We can't compile instructions that use ports, the interpreter handles the waiting for those
+    for arg in instr.args:
+        if arg.__class__ is PortLiteral:
+            return None
+
+    op = instr.op
+    args = [_operand_expr(arg) for arg in instr.args]
+
+    if op == Opcode.NOP:
+        return advance
+    elif op == Opcode.MOV:
+        # The destination is acc, since it isn't a port
+        return _clamped(args[0]) + advance
+    elif op == Opcode.ADD:
+        if instr.args[0].__class__ is RegisterLiteral:
+            return _clamped("accs[node._register_cursor] * 2") + advance
+        return _clamped("accs[node._register_cursor] + " + args[0]) + advance
+    elif op == Opcode.SUB:
+        if instr.args[0].__class__ is RegisterLiteral:
+            return ["accs[node._register_cursor] = 0"] + advance
+        return _clamped("accs[node._register_cursor] - " + args[0]) + advance
+    elif op == Opcode.NEG:
+        return ["accs[node._register_cursor] = -accs[node._register_cursor]"] + advance
+    elif op == Opcode.SAV:
+        return ["baks[node._register_cursor] = accs[node._register_cursor]"] + advance
+    elif op == Opcode.SWP:
+        return ["cursor = node._register_cursor",
+                "value = accs[cursor]",
+                "accs[cursor] = baks[cursor]",
+                "baks[cursor] = value"] + advance
+    elif op == Opcode.SWT:
+        # The range of integers was checked when the node compiled its instructions,
+        # invalid register pairs from acc are left to the interpreter, so it raises the error
+        if instr.args[0].__class__ is IntegerLiteral:
+            return ["node._register_cursor = " + args[0]] + advance
+        return ["value = " + args[0],
+                "if not {0} > value >= 0:".format(REGISTER_PAIRS),
+                "    return step()",
+                "node._register_cursor = value"] + advance
+    elif op == Opcode.JRO:
+        # We jump like instr_jro does, wrapping around the executable ast, the target of a jro by an integer is known here
+        if instr.args[0].__class__ is IntegerLiteral:
+            return ["node.instruction_pointer = {0}".format((inx + instr.args[0].value) % tis_node.ast_len)]
+        return ["node.instruction_pointer = ({0} + {1}) % {2}".format(inx, args[0], tis_node.ast_len)]
+
+    # The rest of the instructions are jumps, the target is the instruction the label points to
+    jump = ["node.instruction_pointer = {0}".format(tis_node.label_table[instr.args[0].name])]
+    if op == Opcode.JMP:
+        return jump
+
+    condition = {
+        Opcode.JEZ: "accs[node._register_cursor] == 0",
+        Opcode.JNZ: "accs[node._register_cursor] != 0",
+        Opcode.JGZ: "accs[node._register_cursor] > 0",
+        Opcode.JLZ: "accs[node._register_cursor] < 0",
+    }.get(op, None)
+
+    # We leave anything we don't know to the interpreter
+    if condition is None:
+        return None
+
+    return ["if " + condition + ":",
+            "    " + jump[0],
+            "else:",
+            "    " + advance[0]]
+
+
+def compile_node(tis_node):
+    """Compiles a TISNode's ast into a step function that does the same step as TISNode.step, the node has to have its nodes bound.
+    Instructions that don't use ports are turned into Python code, everything else calls TISNode.step."""
+
+    lines = ["def _step():",
+             "    # We let the interpreter handle the node if it's waiting for a port",
+             "    if node.wait_port is not None or node.port_value is not None:",
+             "        return step()",
+             "    ip = node.instruction_pointer"]
+
+    branch = "if"
+    for inx, instr in enumerate(tis_node.exec_ast):
+        source = _instr_source(tis_node, inx, instr)
+        if source is None:
+            source = ["return step()"]
+
+        lines.append("    {0} ip == {1}:".format(branch, inx))
+        lines.extend("        " + line for line in source)
+        branch = "elif"
+
+    # Anything else is left to the interpreter, so it raises the appropriate error
+    lines.append("    else:")
+    lines.append("        return step()")
+
+    # The names that the compiled code uses
+    namespace = {
+        "node": tis_node,
+        "step": tis_node.step,
+        "accs": tis_node.accs,
+        "baks": tis_node.baks,
+    }
+
+    exec(compile("\n".join(lines), "<node {0}>".format(tis_node.id), "exec"), namespace)
+    return namespace["_step"]
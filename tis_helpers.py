@@ -25,6 +25,58 @@ class NodeWriteState(enum.IntEnum):
     WILL_BE_RUNNING = 3
 
 
+# The range of values that the registers can hold, like in the game values outside of it are clamped into it
+VALUE_MIN = -999
+VALUE_MAX = 999
+
+
+def clamp_value(value: int):
+    """Clamps a value into the range that the registers can hold."""
+    return VALUE_MIN if value < VALUE_MIN else VALUE_MAX if value > VALUE_MAX else value
+
+
+# The number of acc and bak register pairs in a node, swt switches between them
+REGISTER_PAIRS = 8
+
+
+class Opcode(enum.IntEnum):
+    """The instruction opcodes, the parser converts the lexed instruction names into these."""
+    MOV = 0
+    NOP = 1
+    SWP = 2
+    SWT = 3
+    SAV = 4
+    ADD = 5
+    SUB = 6
+    NEG = 7
+    JMP = 8
+    JEZ = 9
+    JNZ = 10
+    JGZ = 11
+    JLZ = 12
+    JRO = 13
+    HCF = 14
+
+    def __str__(self):
+        return self.name
+
+
+class Port(enum.IntEnum):
+    """The ports, the parser converts the lexed port names into these.
+    The directions fit in two bits, and are ordered so that flipping the lowest bit gives the opposite direction,
+    the special ports come after them so they can be told apart with port >= ANY."""
+    UP = 0
+    DOWN = 1
+    LEFT = 2
+    RIGHT = 3
+    ANY = 4
+    LAST = 5
+    NIL = 6
+
+    def __str__(self):
+        return self.name
+
+
 def validate_node(node):
     """Validates an entire TIS node. Raises a TISSyntaxError if the validation failed, otherwise returns None."""
     for ast_node in node.ast:
@@ -39,72 +91,67 @@ def validate_node(node):
 
 # The dictionary of instruction opcodes to arguments of the instr_check functions. If an opcode isn't in this dict, it's manually checked
 opcode_check_dict = {
-    "mov": (2, ((IntegerLiteral, PortLiteral, RegisterLiteral), (PortLiteral, RegisterLiteral))),
-    "nop": (0,),
-    "swp": (0,),
-    "swt": (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
-    "sav": (0,),
-    "add": (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
-    "sub": (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
-    "neg": (0,),
-    "jmp": (1, LabelReference),
-    "jez": (1, LabelReference),
-    "jnz": (1, LabelReference),
-    "jgz": (1, LabelReference),
-    "jlz": (1, LabelReference),
-    "jro": (1, (IntegerLiteral, PortLiteral, RegisterLiteral))
+    Opcode.MOV: (2, ((IntegerLiteral, PortLiteral, RegisterLiteral), (PortLiteral, RegisterLiteral))),
+    Opcode.NOP: (0,),
+    Opcode.SWP: (0,),
+    Opcode.SWT: (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
+    Opcode.SAV: (0,),
+    Opcode.ADD: (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
+    Opcode.SUB: (1, (IntegerLiteral, PortLiteral, RegisterLiteral)),
+    Opcode.NEG: (0,),
+    Opcode.JMP: (1, LabelReference),
+    Opcode.JEZ: (1, LabelReference),
+    Opcode.JNZ: (1, LabelReference),
+    Opcode.JGZ: (1, LabelReference),
+    Opcode.JLZ: (1, LabelReference),
+    Opcode.JRO: (1, (IntegerLiteral, PortLiteral, RegisterLiteral))
 }
 
 
+# The opcode_check_dict normalised once at import, every opcode maps to its number of arguments,
+# and a tuple with the tuple of allowed ast node types for each argument
+_OPCODE_CHECK_NORM = {}
+for _op, _check_args in opcode_check_dict.items():
+    if len(_check_args) == 1:
+        _arg_types = ()
+    elif type(_check_args[1]) is not tuple:
+        _arg_types = ((_check_args[1],),)
+    elif type(_check_args[1][0]) is not tuple:
+        _arg_types = (_check_args[1],)
+    else:
+        _arg_types = _check_args[1]
+    _OPCODE_CHECK_NORM[_op] = (_check_args[0], _arg_types)
+del _op, _check_args, _arg_types
+
+
 def validate_instruction(node):
     """Validates an ast_node. Raises a TISSyntaxError if the validation failed, otherwise returns None."""
 
     # We determine what ast node it is
-    if type(node) == NArgumentInstruction:
+    if isinstance(node, NArgumentInstruction):
 
-        # We try to check in the opcode_check_dict
-        check_args = opcode_check_dict.get(node.op, None)
+        # We try to check in the normalised opcode_check_dict
+        check_args = _OPCODE_CHECK_NORM.get(node.op, None)
 
         if check_args is not None:
-            # We check with the provided args
-            instr_arg_num_check(node, check_args[0])
-            if len(check_args) > 1:
-                # We convert the check_args so they're uniform
-                if type(check_args[1]) is tuple:
-                    if type(check_args[1][0]) is not tuple:
-                        check_args = (check_args[0], ((*check_args[1],),))
-                else:
-                    check_args = (check_args[0], ((check_args[1],),))
-
-                for inx, arg in enumerate(node.args):
-                    print(arg, inx)
-                    instr_arg_type_check(arg, check_args[1][inx])
+            arg_num, arg_types = check_args
+
+            # We check the number of arguments
+            if len(node.args) != arg_num:
+                raise TISSyntaxError("{0} instruction did not have required {1} arguments, it had {2}."
+                                     .format(node.op.name.capitalize(), arg_num, len(node.args)))
+
+            # We check the type of each argument
+            for arg, allowed_types in zip(node.args, arg_types):
+                if type(arg) not in allowed_types:
+                    raise TISSyntaxError(
+                        "Type of instruction argument was {0}, but had to be one of {1}.".format(type(arg), allowed_types))
             return
 
         # We have a switch statement for determining what instruction it is if it isn't in the opcode_check_dict
-        if node.op == "hcf":
+        if node.op == Opcode.HCF:
             raise TISSyntaxError("You can't have halt-and-catch-fire instructions in a program.")
 
-    elif type(node) == LabelReference:
+    elif isinstance(node, LabelReference):
         # We return the label name so the outer loop can validate it
         return node.name
-
-
-def instr_arg_type_check(node: NArgumentInstruction, _type):
-    """Raises a TISSyntaxError if the passed instruction argument (regular ast_node) isn't of _type, 
-    or if the type of the passed node is not in _type."""
-    if type(_type) is tuple:
-        if type(node) not in _type:
-            raise TISSyntaxError(
-                "Type of instruction argument was {0}, but had to be one of {1}.".format(type(node), _type))
-    else:
-        if type(node) is not _type:
-            raise TISSyntaxError(
-                "Type of instruction argument was {0}, but had to be {1}.".format(type(node), _type))
-
-
-def instr_arg_num_check(node: NArgumentInstruction, num: int):
-    """Raises a TISSyntaxError if the passed node doesn't have num number of arguments."""
-    if len(node.args) is not num:
-        raise TISSyntaxError("{0} instruction did not have required {1} arguments, it had {2}."
-                             .format(node.op.capitalize(), num, len(node.args)))
@@ -5,11 +5,14 @@ from collections import namedtuple
 
 TokenDef = namedtuple("TokenDef", ("name", "matcher", "source_sink", "converter"))
 
+# The characters that labels and label references are made of
+_LABEL_CHARS = r"[0-9a-zA-Z~`$%^&*()_\-+={}\[\]|\\;'\"<>.?/]"
+
 # The tokens we're going to have
 class TokenType(object):
-    # The token definitions
-    # (NAME, MATCHER, (SOURCE, SINK), CONVERTER)
-    _defs = [
+    # The keyword definitions, these are looked up by whole words instead of being matched by the regex
+    # (NAME, KEYWORD, (SOURCE, SINK), CONVERTER)
+    _keyword_defs = [
         # Instructions
         TokenDef("INSTRUCTION", "mov", (False, False), lambda s: "mov"),
         TokenDef("INSTRUCTION", "nop", (False, False), lambda s: "nop"),
@@ -30,9 +33,6 @@ class TokenType(object):
         # Registers
         TokenDef("REGISTER", "acc", (True, True), lambda s: "ACC"),
 
-        # Values
-        TokenDef("INTEGER", re.compile(r"(-?([1-9])([0-9]*))|(0)"), (True, False), int),
-
         # Ports
         TokenDef("PORT", "up", (True, True), lambda s: "UP"),
         TokenDef("PORT", "down", (True, True), lambda s: "DOWN"),
@@ -40,25 +40,34 @@ class TokenType(object):
         TokenDef("PORT", "right", (True, True), lambda s: "RIGHT"),
         TokenDef("PORT", "last", (True, True), lambda s: "LAST"),
         TokenDef("PORT", "any", (True, True), lambda s: "ANY"),
-        TokenDef("PORT", "nil", (True, True), lambda s: "NIL"),
+        TokenDef("PORT", "nil", (True, True), lambda s: "NIL")
+    ]
+
+    # The token definitions
+    # (NAME, MATCHER, (SOURCE, SINK), CONVERTER)
+    _defs = [
+        # Label definitions, these have to be first in the def list,
+        # since a label is the same text as a label reference or keyword, but with a colon after it
+        TokenDef("LABEL", _LABEL_CHARS + r"+:", (False, False), lambda s: s[:-1]),
+
+        # Values
+        TokenDef("INTEGER", r"(?:-?[1-9][0-9]*)|0", (True, False), int),
 
         # Whitespace and the like
-        TokenDef("NODE_SPECIFIER", re.compile(r"(@)([0-9]+)"), (False, False), lambda s: int(s[1:])),
-        TokenDef("SEPARATOR", re.compile(r",+"), (False, False), None),
-        TokenDef("LABEL", re.compile(r"^(([0-9]|[a-zA-z]|[~`$%^&*()_\-+={}\[\]|\\;'\"<>.?/])+?:)"), (False, False), lambda s: s[:-1]),
+        TokenDef("NODE_SPECIFIER", r"@[0-9]+", (False, False), lambda s: int(s[1:])),
+        TokenDef("SEPARATOR", r",+", (False, False), None),
         # A label inside an instruction, a label reference.
-        # This has to stay in this position in the def list, since we want matches to not chose this is ports are available
-        TokenDef("LABEL_REF", re.compile(r"([0-9a-zA-z~`$%^&*()_\-+={}\[\]|\\;'\"<>.?/])+"), (False, False),
-                 lambda s: s),
-        TokenDef("WHITESPACE", re.compile(r"[ \n\t]+"), (False, False), None),
-        TokenDef("COMMENT", re.compile(r"#[ 0-9a-zA-z~`$%^&*()_\-+={}\[\]|\\;'\"<>.?/]+"), (False, False), None)
+        # This has to stay after the integers in the def list, words starting with letters are checked for keywords before this
+        TokenDef("LABEL_REF", _LABEL_CHARS + r"+", (False, False), lambda s: s),
+        TokenDef("WHITESPACE", r"[ \n\t]+", (False, False), None),
+        TokenDef("COMMENT", r"#[ 0-9a-zA-Z~`$%^&*()_\-+={}\[\]|\\;'\"<>.?/]+", (False, False), None)
     ]
 
     _multi_defs = {}
 
 # We set the def names to be attributes of the tokentype class
 # If we get a name collision, we add those names into a list with the same name
-for token in TokenType._defs:
+for token in TokenType._keyword_defs + TokenType._defs:
     try:
         type_ = getattr(TokenType, token.name)
 
@@ -77,89 +86,101 @@ for name, val in TokenType._multi_defs.items():
     # We replace the name
     setattr(TokenType, name, val)
 
-# Represents a token in a source string with a specific start position, type, and value.
-Token = namedtuple("Token", ("type", "value", "slice"))
-
-
-def get_first_token(source: str, start: int=0):
-    """Gets the longest matching token from the source starting at start."""
-
-    # Text to match on
-    match_text = source[start:]
-
-    # The token to return and the text it came from
-    token = None
-    token_text = ""
+# Represents a token in a source string with a type, value, and the start and end positions of its text.
+Token = namedtuple("Token", ("type", "value", "start", "end"))
 
-    for token_type in TokenType._defs:
-        # We unpack the definition of the token
-        name, pattern, src_snk, converter = token_type
+# The lookup for lowercase keywords into their token defs
+_KEYWORDS = {token_def.matcher: token_def for token_def in TokenType._keyword_defs}
 
-        if isinstance(pattern, str):
-            # We match text
-            if not match_text.lower().startswith(pattern):
-                continue
-            # It matched
-            match_value = pattern
+# The lookup for the regex group aliases into the token defs, defs with the same name get numbered aliases
+_ALIAS_TO_DEF = {}
+_master_patterns = []
+for token_def in TokenType._defs:
+    alias = token_def.name
+    if token_def.name in TokenType._multi_defs:
+        alias += "_" + str(TokenType._multi_defs[token_def.name].index(token_def))
+    _ALIAS_TO_DEF[alias] = token_def
 
-        else:
-            # We regex match
-            match = pattern.match(match_text)
+    _master_patterns.append("(?P<{0}>{1})".format(alias, token_def.matcher))
 
-            # Did it match?
-            if not match:
-                 continue
+    # Words are matched right after labels, a word is a keyword if all of it is one, otherwise it's a label reference
+    if token_def is TokenType.LABEL:
+        _master_patterns.append("(?P<WORD>[a-zA-Z]{0}*)".format(_LABEL_CHARS))
 
-            # We get the matched text
-            match_value = match.group(0)
+# All token defs combined into one regex, regex alternation picks the first alternative that matches,
+# so the order of the def list gives the priority of the tokens
+_MASTER_RE = re.compile("|".join(_master_patterns))
+del _master_patterns
 
-        # We only want to keep the longest matches
-        if len(token_text) > len(match_value):
-            continue
 
-        # Some tokens have higher priority then LABEL_REF
-        if token_type == TokenType.LABEL_REF and (token is not None):
-            if token.type in (*TokenType.INSTRUCTION, *TokenType.PORT, TokenType.REGISTER, TokenType.INTEGER):
-                continue
+def get_first_token(source: str, start: int=0):
+    """Gets the first matching token from the source starting at start, in the priority order of the token defs."""
 
-        token_text = match_value
-        # We convert into a token
-        if converter is not None:
-            match_value = converter(match_value)
-        token = Token(token_type, match_value, slice(start, start + len(token_text)))
+    # We take the first token that the generator gives, or return None if none was found
+    for token in lex_gen(source, start):
+        return token
+    return None
 
-    # We return the best token, or None if None were found
-    return token
+def lex_gen(text, start: int=0):
+    """Generates a list of tokens for a source text, starting at start."""
 
-def lex_gen(text):
-    """Generates a list of tokens for a source text."""
+    # We bind everything we look up for each token to locals, since this loop runs for every token in the source
+    match_at = _MASTER_RE.match
+    alias_to_def = _ALIAS_TO_DEF
+    keywords = _KEYWORDS
+    label_ref = TokenType.LABEL_REF
+    text_len = len(text)
 
-    # The starting index
-    start = 0
+    # We match at offsets into the text, so the text is never sliced
+    while start < text_len:
+        match = match_at(text, start)
 
-    while True:
-        if start >= len(text):
+        # We check if a token was found
+        if not match:
             break
 
-        token = get_first_token(text, start)
+        alias = match.lastgroup
+        if alias == "WORD":
+            # We look up the whole word, so a word that only starts with a keyword is a label reference
+            token_type = keywords.get(match.group().lower(), label_ref)
+        else:
+            # We find what def matched
+            token_type = alias_to_def[alias]
 
-        # We check if a token was found
-        if token is None:
-            break
+        # We convert the matched text
+        stop = match.end()
+        match_value = match.group()
+        converter = token_type.converter
+        if converter is not None:
+            match_value = converter(match_value)
 
-        yield token
+        yield Token(token_type, match_value, start, stop)
 
-        # We append it to the list, store the ending of it into the starting index of the next one
-        start = token.slice.stop
+        # We store the ending of the token into the starting index of the next one
+        start = stop
 
 def lex(text):
-    tokens = list(lex_gen(text))
+    """Generates the tokens for a source text, and raises a SyntaxError once the tokens run out if they didn't cover the whole text.
+    The tokens are streamed, so a consumer can drop tokens it doesn't need instead of holding the whole token list."""
+
+    # The end of the last token we've given, the tokens are contiguous and start at 0, so this is all we need for the check
+    stop = 0
+    for token in lex_gen(text):
+        stop = token.end
+        yield token
 
-    if len(tokens) == 0:
+    if stop == 0:
         raise SyntaxError("Was not able to parse anything, please write valid code.")
 
     # We check that all chars were used
-    if not (tokens[0].slice.start == 0 and tokens[-1].slice.stop == len(text)):
-        raise SyntaxError("Was not able to fully parse the code, end of code is char {0}, while end of source is char {1}. Peek of code ending:\n{2}".format(tokens[-1].slice.stop, len(text), text[tokens[-1].slice.stop - 10: tokens[-1].slice.stop + 10]))
+    if stop != len(text):
+        raise SyntaxError("Was not able to fully parse the code, end of code is char {0}, while end of source is char {1}. Peek of code ending:\n{2}".format(stop, len(text), text[stop - 10: stop + 10]))
+
 
-    return tokens
\ No newline at end of file
+def lex_filtered(text):
+    """Generates the tokens for a source text like lex, but without the whitespace and comments, which the parser doesn't need."""
+    whitespace = TokenType.WHITESPACE
+    comment = TokenType.COMMENT
+    for token in lex(text):
+        if token.type is not whitespace and token.type is not comment:
+            yield token
@@ -1,7 +1,7 @@
-from tis_node import TISNode
+from tis_node import TISNode, compile_machine, run_compiled
 from functools import partial
+import collections
 import curses
-import math
 import tis_helpers
 import tis_parser
 
@@ -42,8 +42,9 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
     # --------------------------------------------
     # We have node-name --> tuple(height, width, begin_y, begin_x), note that the order is y, x, not x, y.
     dimensions = {}
-    quarter_h = math.floor(lines / 4)
-    third_w = math.floor(cols / 3)
+    quarter_h = lines // 4
+    third_w = cols // 3
+    half_third_w = third_w // 2
     # Creating the tiled node-windows' dimensions
     for i in range(node_h):
         for j in range(node_w):
@@ -65,7 +66,7 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
     cons_out_w = cols - 4
     windows["cons_out"] = windows["cons"].derwin(cons_out_h, cons_out_w, 2, 1)
     windows["cons_out"].scrollok(False)
-    windows["cons"].addstr(1, int((cols / 2) - 8), "This is the console:", curses.A_STANDOUT)
+    windows["cons"].addstr(1, cols // 2 - 8, "This is the console:", curses.A_STANDOUT)
     windows["std"] = stdscr
 
     # Refreshes the whole screen efficiently
@@ -75,6 +76,11 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
         curses.doupdate()
     refresh()
 
+    # Draws the windows that have been marked with noutrefresh since the last update,
+    # this is done once per step instead of once per print
+    def flush():
+        curses.doupdate()
+
     # Descriptions for each node
     node_descs = {
         0: "upper left",
@@ -95,7 +101,7 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
         window = windows[i + 1]
         window.border()
         top_descr = "This is the {} node".format(node_descs[i])
-        window.move(0, 1 + int(third_w / 2) - int(len(top_descr) / 2))
+        window.move(0, 1 + half_third_w - len(top_descr) // 2)
         window.addstr(top_descr, curses.A_BOLD)
         window.scrollok(False)
         # We create the subwindow
@@ -109,38 +115,27 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
 
     # We change print to enter our text into the console window, within our console
 
-    def _print(*args):
-        global _print_bfr
+    start_point = (2, 1)
+    _print_lines = cons_out_h - start_point[0]
+    # The lines are cut one column short of the window's width, since a line that fills the last column
+    # wraps the cursor onto the next row, and the window doesn't scroll
+    _print_cols = cons_out_w - start_point[1] - 1
 
-        start_point = (2, 1)
-        _print_lines = cons_out_h - start_point[0]
-        _print_cols = cons_out_w - start_point[1]
-        windows["cons_out"].move(*start_point)
+    # The already wrapped lines that are shown in the console, the deque drops the oldest lines that don't fit
+    print_bfr = collections.deque(maxlen=_print_lines)
+
+    def _print(*args):
         output_str = " ".join(str(item) for item in args)
-        output_str.replace("\n", "\n" + " " * start_point[1])
-        _print_bfr += output_str + "\n" + " " * start_point[1]
-
-        # We condition the print buffer so that no line exceeds the max line length,
-        # and the number of lines is no longer than the max
-        __print_bfr = ""
-        __num_lines = 1
-        _split_bfr = [item[:-1] for item in _print_bfr.split("\n")]
-
-        for line in _split_bfr:
-            while len(line) > _print_cols and __num_lines < _print_lines:
-                __print_bfr += "\n" + " " * start_point[1] + line[:_print_cols]
-                __num_lines +=1
-            __print_bfr += "\n" + " " * start_point[1] + line[:_print_cols]
-            __num_lines += 1
-
-        __print_bfr = "\n".join(__print_bfr.split("\n")[-_print_lines:])
-        windows["cons_out"].erase()
-        windows["cons_out"].addstr(__print_bfr)
-        windows["cons_out"].move(*start_point)
-        refresh()
 
-    def _input(prompt: str):
+        # We split the output so that no line exceeds the max line length
+        for line in output_str.split("\n"):
+            print_bfr.extend([line[i:i + _print_cols] for i in range(0, len(line), _print_cols)] or [""])
 
+        windows["cons_out"].erase()
+        windows["cons_out"].addstr("\n".join(" " * start_point[1] + line for line in print_bfr))
+        windows["cons_out"].move(*start_point)
+        # Only the console has changed, and it's drawn when we flush
+        windows["cons_out"].noutrefresh()
 
     # This is bad form but necessary
     print = _print
@@ -164,6 +159,8 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
 
     # We create the nodes
     machine = {n_id: TISNode(n_id, node_height, node_width, ast=val) for n_id, val in ast_root.nodes.items()}
+    for tis_node in machine.values():
+        tis_node.bind_nodes(machine)
 
     for n_id, node in machine.items():
         pass
@@ -171,30 +168,34 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
         # print("Node nr " + str(n_id) + ": " + str(node))
 
     print("Starting machine! ")
+    flush()
     result = input("Press ENTER to start stepping, F to go fast, S to go fast as fuck:")
 
     # Whether we should just skip asking for stepping
-    fast_mode = result is "f"
-    superfast_mode = result is "s"
+    fast_mode = result.lower() == "f"
+    superfast_mode = result.lower() == "s"
 
     try:
         import time
 
         # We check whether we should go fast as fuck boiii
         if superfast_mode:
+            # We compile the nodes once, and keep the step functions for all batches
+            step_fns = compile_machine(machine)
+
             while True:
                 batch_num = 100000
 
                 start = time.time()
-                for i in range(batch_num):
-                    for n_id, tis_node in machine.items():
-                        tis_node.step(nodes=machine)
+                run_compiled(step_fns, batch_num)
+                elapsed = time.time() - start
 
                 step_num += batch_num
 
-                print("10000 steps took:", round(1000 * (time.time() - start), 4), "ms, which means",
-                      round(batch_num / (time.time() - start), 2), "Hz")
+                print("{0} steps took:".format(batch_num), round(1000 * elapsed, 4), "ms, which means",
+                      round(batch_num / elapsed, 2), "Hz")
                 print("Have now done {0} steps.".format(step_num))
+                flush()
 
         # We check whether we should go fast
         if fast_mode:
@@ -206,16 +207,17 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
                 for n_id, tis_node in machine.items():
                     print("\nStepping node {0}.".format(n_id))
 
-                    tis_node.step(nodes=machine)
+                    tis_node.step()
 
                     # We print the accs for the node
-                    print("Accs and baks in node {0}:".format(n_id), tis_node.accs, "|", tis_node.baks,
+                    print("Accs and baks in node {0}:".format(n_id), tis_node.accs.tolist(), "|", tis_node.baks.tolist(),
                           "\nCurrent acc and bak:", tis_node.accs[tis_node._register_cursor], "|",
                           tis_node.baks[tis_node._register_cursor])
 
                 print("Step took:", round(1000 * (time.time() - start), 4), "ms, which means",
                       round(1 / (time.time() - start), 2), "Hz")
                 print("Have now done {0} steps.".format(step_num))
+                flush()
 
         else:
             # The main execution/stepping loop for asking for input
@@ -226,21 +228,23 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
                 for n_id, tis_node in machine.items():
                     print("\nStepping node {0}.".format(n_id))
 
-                    tis_node.step(nodes=machine)
+                    tis_node.step()
 
                     # We print the accs for the node
-                    print("Accs and baks in node {0}:".format(n_id), tis_node.accs, "|", tis_node.baks,
+                    print("Accs and baks in node {0}:".format(n_id), tis_node.accs.tolist(), "|", tis_node.baks.tolist(),
                           "\nCurrent acc and bak:", tis_node.accs[tis_node._register_cursor], "|",
                           tis_node.baks[tis_node._register_cursor])
 
                 print("Step took:", round(1000 * (time.time() - start), 4), "ms, which means",
                       round(1 / (time.time() - start), 2), "Hz")
                 print("Have now done {0} steps.".format(step_num))
+                flush()
                 resp = input("\nPress ENTER to step again, p to print all nodes:")
                 # We check if we should print all nodes
                 if resp.startswith("p"):
                     for n_id, node in machine.items():
                         print("Node nr " + str(n_id) + ":\n" + str(node))
+                    flush()
 
     except (tis_helpers.ExecutionError, KeyboardInterrupt) as e:
         for n_id, node in machine.items():
@@ -248,6 +252,7 @@ def run_src(source: str="@0\nnop", node_height: int=4, node_width: int=5, stdscr
 
         print(str(e))
         print("Exiting.")
+        flush()
 
 
 if __name__ == "__main__":
@@ -265,6 +270,4 @@ if __name__ == "__main__":
     # We start the execution, and we use ncurses
     print("Ok! Starting execution!\n")
 
-    # This is the string which keeps the currently printed data
-    _print_bfr = ""
     curses.wrapper(partial(run_src, source, 4, 5))
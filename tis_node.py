@@ -1,126 +1,166 @@
+import array
+import functools
 from tis_helpers import *
+from tis_codegen import compile_node
+
+# The kinds of compiled instruction arguments, the payload of an ARG_INT is the value, of an ARG_PORT the Port,
+# of an ARG_REG None, and of an ARG_LABEL the executable ast index the label points to
+ARG_INT = 0
+ARG_PORT = 1
+ARG_REG = 2
+ARG_LABEL = 3
+
+# The opposite of each direction Port, indexed by the direction. Flipping the lowest bit of a direction gives its opposite,
+# the table keeps the opposites as Port members so they print as port names
+OPPOSITE = tuple(Port(direction ^ 1) for direction in (Port.UP, Port.DOWN, Port.LEFT, Port.RIGHT))
+
+
+def swt_range_error(value: int):
+    """Returns the TISSyntaxError for switching to a register pair that doesn't exist."""
+    return TISSyntaxError(
+        "SWT operand was not in the valid range of registers. Range is {0}-{1} inclusive, operand was {2}."
+            .format(0, REGISTER_PAIRS - 1, value))
+
+
+@functools.lru_cache(maxsize=None)
+def neighbour_table(grid_height: int, grid_width: int):
+    """Returns a tuple with the ids of the up, down, left, and right neighbours of each node id in a grid,
+    a neighbour is None if it would be outside the grid. This is computed once per grid size."""
+    num_nodes = grid_height * grid_width
+    return tuple(
+        (
+            node_id - grid_width if node_id - grid_width >= 0 else None,
+            node_id + grid_width if node_id + grid_width < num_nodes else None,
+            node_id - 1 if node_id % grid_width != 0 else None,
+            node_id + 1 if (node_id + 1) % grid_width != 0 else None,
+        )
+        for node_id in range(num_nodes)
+    )
 
 
 class TISNode(object):
     """Represents a single node in the grid."""
 
+    # The attributes are fixed, so we store them in slots instead of a dict per node
+    __slots__ = ("id", "node_dict", "ast", "exec_ast", "ast_len", "instruction_pointer", "up_id", "down_id", "left_id", "right_id",
+                 "direction_ids", "port_value", "wait_port", "sent_value", "last_port", "accs", "baks", "_register_cursor",
+                 "label_table", "compiled", "blocked")
+
     def __init__(self, id: int, grid_height: int, grid_width: int, ast: SingleNodeAST = None):
         """Creates the Node, with specified ids for the nodes in different directions."""
 
         # The id of this node
         self.id = id
 
-        # A lookup dict for id to node, only filled on runtime
+        # A lookup dict for id to node, set by bind_nodes before the node is stepped
         self.node_dict = None
 
         # The abstract syntax tree
-        self.ast = [] if ast is None else ast.ast
-
-        # A lookup for the ast. The values are indices into our ast, and the indices are the index of the instruction the ast index points to.
-        # Basically, finds the index of the Nth instruction node
-        self.ast_instr_real_lookup = []
-
-        # We populate the instruction lookup
-        for ast_inx, ast_node in enumerate(self.ast):
-            if type(ast_node) == NArgumentInstruction:
-                self.ast_instr_real_lookup.append(ast_inx)
-
-        # A reverse lookup of the ast_instr_real_lookup, note that this is a dict and not a list, since it's a strict reverse lookup
-        self.ast_real_instr_lookup = {}
+        self.ast = () if ast is None else ast.ast
 
-        # We populate the instruction lookup
-        for instr_inx, instr_node_inx in enumerate(self.ast_instr_real_lookup):
-            self.ast_real_instr_lookup[instr_node_inx] = instr_inx
+        # The executable ast, this is the ast without the labels, so the instruction pointer always points at an instruction.
+        # A node without instructions gets a nop, so stepping it just idles
+        self.exec_ast = [ast_node for ast_node in self.ast if ast_node.__class__ is not Label] or [NArgumentInstruction(Opcode.NOP, ())]
 
         # For performance reasons, we precompute this
-        self.ast_len = len(self.ast)
+        self.ast_len = len(self.exec_ast)
 
-        # The instruction we're at, an index into the ast
+        # The instruction we're at, an index into the executable ast
         self.instruction_pointer = 0
 
-        # Port ids, calculated from our id and the grid sizes
-        self.up_id = id - grid_width if not id - grid_width < 0 else None
-        self.down_id = id + grid_width if id + grid_width < grid_width * grid_height else None
-        self.left_id = id - 1 if (id > 0) and (id % grid_width is not 0) else None
-        self.right_id = id + 1 if (id + 1 < grid_width * grid_height) and ((id + 1) % grid_width is not 0) else None
+        # A lookup for directions to id, indexed by the direction Port values, it's shared by all nodes in the grid
+        neighbours = neighbour_table(grid_height, grid_width)
+        if not 0 <= id < len(neighbours):
+            raise TISSyntaxError("Node {0} is outside of the grid, which has nodes 0-{1}.".format(id, len(neighbours) - 1))
+        self.direction_ids = neighbours[id]
 
-        # A lookup for directions to id
-        self.directions = {"UP": self.up_id, "DOWN": self.down_id, "LEFT": self.left_id, "RIGHT": self.right_id}
+        # Port ids
+        self.up_id, self.down_id, self.left_id, self.right_id = self.direction_ids
 
         # The value at the different ports
-        # When there is data at this port, the format is (target_port: int, value: int), where target_port is the uppercase name of the port
+        # When there is data at this port, the format is (target_port: Port, value: int)
         self.port_value = None
 
-        # The port we're waiting for to send something to us, will be uppercase name of the port
+        # The port we're waiting for to send something to us, will be a Port
         self.wait_port = None
 
         # A temporary variable set by another node when something is sent to us
-        # The format is (port: str, value: int)
+        # The format is (port: Port, value: int)
         self.sent_value = None
 
-        # The last port something was sent to, will be uppercase name of the port
+        # The last port something was sent to, will be a Port
         self.last_port = None
 
-        # Special values
-        self.accs = [0] * 8
-        self.baks = [0] * 8
+        # Special values, the registers are stored as 16 bit ints since they only hold values from VALUE_MIN to VALUE_MAX
+        self.accs = array.array("h", [0] * REGISTER_PAIRS)
+        self.baks = array.array("h", [0] * REGISTER_PAIRS)
 
         # The cursor/index into the bak and acc lists
         self._register_cursor = 0
 
         # We look through our AST and create a lookup table for the labels
-        # The table is a lookup for labelname into ast index
+        # The table is a lookup for labelname into the executable ast index of the instruction after the label,
+        # labels at the end of the ast wrap around to the first instruction
         self.label_table = {}
-        for inx, node in enumerate(self.ast):
-            if type(node) == Label:
-                self.label_table[node.name] = inx
+        exec_inx = 0
+        for node in self.ast:
+            if node.__class__ is Label:
+                self.label_table[node.name] = exec_inx % self.ast_len
+            else:
+                exec_inx += 1
 
         # We validate our ast, if it's valid, this won't output anything, if it's invalid, this will raise a TISSyntaxError
         validate_node(self)
 
-        # The state the node is in
-        # This can is one of the NodeWriteState values
-        self.state = NodeWriteState.RUNNING
+        # The compiled instructions, a list parallel to the executable ast. Instructions are compiled into a tuple of their instruction function
+        # and their compiled arguments. This is done once so stepping doesn't have to inspect the ast nodes
+        self.compiled = [self.compile_ast_node(inx, ast_node) for inx, ast_node in enumerate(self.exec_ast)]
+
+        # Whether the node is blocked on a port, this is what the state property is derived from
+        self.blocked = False
+
+    @property
+    def state(self):
+        """The NodeWriteState the node is in, either RUNNING, or WILL_BE_RUNNING when the node is blocked on a port."""
+        return NodeWriteState.WILL_BE_RUNNING if self.blocked else NodeWriteState.RUNNING
 
     def __str__(self):
         return "TIS Node, \n\tport ids: {0}, \n\tport value: {1}, \n\taccs: {2}, \n\tbaks: {3}, \n\tregister cursor: {4}, \n\tstate: {5}, " \
                "\n\twait port: {6}, \n\tsent value: {7}, \n\tlast port: {8}, \n\tinstruction pointer: {9}, \n\tcurrent instruction: {10}, \n\tast: {11}".format(
             "up: {0}, down: {1}, left: {2}, right: {3}".format(self.up_id, self.down_id, self.left_id, self.right_id),
             str(self.port_value),
-            self.accs,
-            self.baks,
+            self.accs.tolist(),
+            self.baks.tolist(),
             self._register_cursor,
             str(self.state),
             str(self.wait_port),
             str(self.sent_value),
             str(self.last_port),
             str(self.instruction_pointer),
-            str(self.ast[self.instruction_pointer]),
+            str(self.exec_ast[self.instruction_pointer]),
             [str(node) for node in self.ast]
         )
 
     def get_node_with_id(self, _id: int):
         """Returns the node that has a specific id from the list of nodes. Returns None if there isn't one with that id."""
-        try:
-            return self.node_dict[_id]
-        except KeyError:
-            return None
-
-    def step(self, *, nodes: dict):
-        """Does a singe computational step. It considers all non-None values of the neighbouring nodes to be real nodes."""
+        return self.node_dict.get(_id)
 
-        # We compute a lookup table for the nodes, this is for performance reasons
+    def bind_nodes(self, nodes: dict):
+        """Sets the dict of node ids to nodes that this node sends to and receives from, this has to be done before stepping."""
         self.node_dict = nodes
 
-        # We check what ast node is the current one, it has to be an instruction or label, all other are disallowed
-        cur_node = self.ast[self.instruction_pointer]
+    def step(self):
+        """Does a singe computational step. It considers all non-None values of the neighbouring nodes to be real nodes."""
+
+        # We get the compiled instruction we're at
+        cur_instr = self.compiled[self.instruction_pointer]
 
         # If we are waiting for something, we check if we've got it
         if self.wait_port is not None:
             if self.sent_value is not None:
 
                 # We execute the instruction we we're stuck on
-                if self.do_instr(cur_node):
+                if self.do_instr(cur_instr):
                     # We aren't waiting anymore
                     self.wait_port = None
 
@@ -128,7 +168,7 @@ class TISNode(object):
                     self.sent_value = None
 
                     # We're no longer waiting, so we go into running mode again and exit this step
-                    self.state = NodeWriteState.RUNNING
+                    self.blocked = False
 
                     self.incr_instr_pointer()
 
@@ -137,52 +177,79 @@ class TISNode(object):
         elif self.port_value is not None:
             # We're sending something to another node
             # We execute the instruction, and reset the send variables if the sending was completed
-            if self.do_instr(cur_node):
+            if self.do_instr(cur_instr):
                 # We reset the port value
                 self.port_value = None
 
                 # We're no longer waiting, so we go into running mode again and exit this step
-                self.state = NodeWriteState.RUNNING
+                self.blocked = False
 
                 self.incr_instr_pointer()
 
             return
 
-        if type(cur_node) == NArgumentInstruction:
-
-            # We check if we should continue executing
-            if self.do_instr(cur_node):
-                self.incr_instr_pointer()
-
-        elif type(cur_node) == Label:
-            # We increment the instruction pointer, and try stepping again
+        # We check if we should continue executing
+        if self.do_instr(cur_instr):
             self.incr_instr_pointer()
-            self.step(nodes=nodes)
 
-        else:
-            raise ExecutionError("Invalid code at ast node with id {0}: {1}".format(self.instruction_pointer, cur_node))
+    def compile_ast_node(self, inx: int, ast_node):
+        """Compiles an executable ast node into the tuple of its instruction method bound to this node and its compiled arguments.
+        The compiled arguments are a flat tuple with the ARG_ kind and the payload of each argument after each other,
+        the payload is the value, port, or label table index of the argument."""
 
-    def do_instr(self, instruction_node):
-        """Gets an NArgumentInstruction ast node and executes it."""
+        if ast_node.__class__ is not NArgumentInstruction:
+            raise ExecutionError("Invalid code at ast node with id {0}: {1}".format(inx, ast_node))
 
-        # We get the appropriate instruction function to pass this to
-        instr_func = getattr(self, "instr_" + instruction_node.op, None)
+        # We get the appropriate instruction function for the opcode
+        instr_func = _OP_DISPATCH[ast_node.op]
 
         # If we couldn't find a function to do it, we raise a NotImplementedError
         if instr_func is None:
             raise NotImplementedError(
-                "Was not able to find instruction function for opcode {0}.".format(instruction_node.op))
-        else:
-            # We return the result of the instruction function
-            return instr_func(instruction_node)
+                "Was not able to find instruction function for opcode {0}.".format(ast_node.op))
+
+        args = []
+        for arg in ast_node.args:
+            arg_cls = arg.__class__
+            if arg_cls is IntegerLiteral:
+                args += (ARG_INT, arg.value)
+            elif arg_cls is PortLiteral:
+                args += (ARG_PORT, arg.name)
+            elif arg_cls is RegisterLiteral:
+                args += (ARG_REG, None)
+            else:
+                # The argument is a LabelReference, we resolve it here so jumps don't have to look in the label table
+                target = self.label_table.get(arg.name, None)
+                if target is None:
+                    raise TISSyntaxError("Was not able to find label for reference {0}.".format(arg.name))
+                args += (ARG_LABEL, target)
+
+        # A swt by an integer always switches to the same pair, so we check its range once here
+        if ast_node.op == Opcode.SWT and args[0] == ARG_INT and not (REGISTER_PAIRS > args[1] >= 0):
+            raise swt_range_error(args[1])
+
+        # A jro by an integer always lands on the same instruction, so we compile it into a jmp to that instruction
+        if ast_node.op == Opcode.JRO and args[0] == ARG_INT:
+            instr_func = _OP_DISPATCH[Opcode.JMP]
+            args = [ARG_LABEL, (inx + args[1]) % self.ast_len]
+
+        # We bind the instruction function to this node once, so executing it doesn't have to pass the node
+        return instr_func.__get__(self, TISNode), tuple(args)
+
+    def do_instr(self, instr: tuple):
+        """Gets a compiled instruction and executes it."""
+        instr_func, args = instr
+
+        # We return the result of the instruction function
+        return instr_func(args)
 
     def incr_instr_pointer(self):
         """Increments the instruction pointer and handles wrap-around so we loop the whole ast."""
         self.instruction_pointer += 1
-        if self.instruction_pointer is self.ast_len:
+        if self.instruction_pointer == self.ast_len:
             self.instruction_pointer = 0
 
-    def get_value_from_port(self, port: str):
+    def get_value_from_port(self, port: Port):
         """This function is called whenever we need to get something from another port. It first sets up waiting, and then returns the gotten value.
         It returns None if the port hasn't been transferred to."""
 
@@ -194,7 +261,7 @@ class TISNode(object):
                 self.last_port = self.sent_value[0]
 
                 # We reset the port value of the sending node
-                self.get_node_with_id(self.directions[self.last_port]).port_value = None
+                self.get_node_with_id(self.direction_ids[self.last_port]).port_value = None
 
                 # We return the value
                 return self.sent_value[1]
@@ -203,9 +270,9 @@ class TISNode(object):
                 return None
 
         # If the port is NIL, we return 0
-        if port == "NIL":
+        if port == Port.NIL:
             return 0
-        elif port == "LAST":
+        elif port == Port.LAST:
             # If the port is LAST, we look up the value for last, and block forever if there isn't one
             port = self.last_port
             if port is None:
@@ -213,37 +280,35 @@ class TISNode(object):
 
         # We set up wait_port properly, and start waiting
         self.wait_port = port
-        self.state = NodeWriteState.WILL_BE_RUNNING
+        self.blocked = True
 
-    def set_value_to_port(self, port: str, value: int):
+    def set_value_to_port(self, port: Port, value: int):
         """Sets the value to the port. Returns False until the value has been transferred. Returns True when the value has been transferred."""
 
         # We set the port value to what we're sending
         self.port_value = (port, value)
 
-        # We set the state to will be running
-        self.state = NodeWriteState.WILL_BE_RUNNING
-
-        # We check if the port is a special one
-        if port in ("ANY", "LAST", "NIL"):
-            if port == "ANY":
-                # We check each port in the order the game does
-                order = ("UP", "LEFT", "RIGHT", "DOWN")
-
-                # We go through the directions in order
-                for direction in order:
-                    if self.directions[direction] is not None:
-                        # We try to send to the port
-                        result = self.set_value_to_port(direction, value)
-
-                        if result:
-                            # We were successful in sending to the port
-                            return result
-                else:
-                    # If we weren't successful in sending to the ANY port this step, we return False
-                    return False
-
-            elif port == "LAST":
+        # We're blocked until the value has been transferred
+        self.blocked = True
+
+        # We check if the port is a special one, these come after the four directions in Port
+        if port >= Port.ANY:
+            if port == Port.ANY:
+                # We try to send to each port that has a node in the order the game does, and return when we were successful
+                direction_ids = self.direction_ids
+                if direction_ids[Port.UP] is not None and self.set_value_to_port(Port.UP, value):
+                    return True
+                if direction_ids[Port.LEFT] is not None and self.set_value_to_port(Port.LEFT, value):
+                    return True
+                if direction_ids[Port.RIGHT] is not None and self.set_value_to_port(Port.RIGHT, value):
+                    return True
+                if direction_ids[Port.DOWN] is not None and self.set_value_to_port(Port.DOWN, value):
+                    return True
+
+                # If we weren't successful in sending to the ANY port this step, we return False
+                return False
+
+            elif port == Port.LAST:
                 # We block forever if the node doesn't have a LAST port set, otherwise we send if possible
                 if self.last_port is None:
                     return False
@@ -255,22 +320,22 @@ class TISNode(object):
                 return True
 
         # We check if there could exist a node to send the value to
-        if self.directions[port] is None:
+        if self.direction_ids[port] is None:
             # There isn't a node at that port, so we basically block forever
             return False
 
         # The node we send to
-        target_node = self.get_node_with_id(self.directions[port])
+        target_node = self.get_node_with_id(self.direction_ids[port])
 
         # We check if the node has any code, as if it doesn't, it can't ever receive, so we automatically block
         if target_node is None:
             return False
 
         # We know that the port points to a node with code, so we check what port we should look in (since one node's RIGHT is another's LEFT)
-        look_for_port = {"UP": "DOWN", "DOWN": "UP", "LEFT": "RIGHT", "RIGHT": "LEFT"}[port]
+        look_for_port = OPPOSITE[port]
 
         # We check if the target node wants a value from us, note that this deals with the case of the node not waiting at all
-        if target_node.wait_port in ("ANY", look_for_port):
+        if target_node.wait_port in (Port.ANY, look_for_port):
 
             # We give the value to the target node
             target_node.sent_value = (look_for_port, value)
@@ -282,143 +347,148 @@ class TISNode(object):
             # The target node didn't want a value from us
             return False
 
-    # From here the instruction functions are defined
-    def instr_mov(self, node: NArgumentInstruction):
+    # From here the instruction functions are defined, they get the compiled arguments of the instruction
+    def instr_mov(self, args: tuple):
         """This opcode moves values to and from different places, called sources and destinations."""
 
         # We make sure there's only one operand
-        if len(node.args) is not 2:
+        if len(args) != 4:
             raise TISSyntaxError(
-                "Invalid number of operands in mov instruction. Number should be 2, was {0}.".format(len(node.args)))
+                "Invalid number of operands in mov instruction. Number should be 2, was {0}.".format(len(args) // 2))
 
-        # The source
-        source = node.args[0]
-        # The destination
-        destination = node.args[1]
+        # The source and the destination
+        source_kind, source, destination_kind, destination = args
 
-        # We do different things depending on the type of source
-        if type(source) == IntegerLiteral:
+        # We do different things depending on the kind of source
+        if source_kind == ARG_INT:
             # The source value is simply the int value
-            source_val = source.value
+            source_val = source
 
-        elif type(source) == PortLiteral:
+        elif source_kind == ARG_PORT:
             # We handle port transfers to the source value
             # We get the value
-            source_val = self.get_value_from_port(source.name)
+            source_val = self.get_value_from_port(source)
 
             # If the value is None, that means we have to wait more for another node to give us a value
             if source_val is None:
                 return
 
-        elif type(source) == RegisterLiteral:
+        elif source_kind == ARG_REG:
             # The source is acc, so we store acc's value in source_val
             source_val = self.accs[self._register_cursor]
 
-        # We do different things depending on the type of destination. We only allow register and port for destination
-        # We do different things depending on the type of source
-        if type(destination) == PortLiteral:
+        # We do different things depending on the kind of destination. We only allow register and port for destination
+        if destination_kind == ARG_PORT:
             # We handle port transfers of the source val to the destination, and we have already handled port-port movs
-            return self.set_value_to_port(destination.name, source_val)
+            return self.set_value_to_port(destination, source_val)
 
-        elif type(destination) == RegisterLiteral:
+        elif destination_kind == ARG_REG:
             # The destination is acc, so we simply store the source_val into acc
-            self.accs[self._register_cursor] = source_val
+            self.accs[self._register_cursor] = clamp_value(source_val)
 
             return True
 
-    def instr_add(self, node: NArgumentInstruction):
+    def instr_add(self, args: tuple):
         """This opcode adds the operand to acc and stores it in acc."""
 
+        # We bind the registers and the cursor to locals, since we use them more than once
+        accs = self.accs
+        cursor = self._register_cursor
+
         # The operand
-        add_operand = node.args[0]
+        add_kind, add_operand = args
 
-        # We do different things depending on the type of argument
-        if type(add_operand) == IntegerLiteral:
+        # We do different things depending on the kind of argument
+        if add_kind == ARG_INT:
             # We simply add to acc
-            self.accs[self._register_cursor] += add_operand.value
+            accs[cursor] = clamp_value(accs[cursor] + add_operand)
 
-        elif type(add_operand) == PortLiteral:
+        elif add_kind == ARG_PORT:
             # We handle port transfers
-            add_operand_value = self.get_value_from_port(add_operand.name)
+            add_operand_value = self.get_value_from_port(add_operand)
 
             # We check if we got a value from the port
             if add_operand_value is None:
                 return
 
             # We add the value
-            self.accs[self._register_cursor] += add_operand_value
+            accs[cursor] = clamp_value(accs[cursor] + add_operand_value)
 
-        elif type(add_operand) == RegisterLiteral:
+        elif add_kind == ARG_REG:
             # This means we add acc to itself
-            self.accs[self._register_cursor] *= 2
+            accs[cursor] = clamp_value(accs[cursor] * 2)
 
         # We successfully executed the instruction
         return True
 
-    def instr_sub(self, node: NArgumentInstruction):
+    def instr_sub(self, args: tuple):
         """This opcode subtracts the operand to acc and stores it in acc."""
 
+        # We bind the registers and the cursor to locals, since we use them more than once
+        accs = self.accs
+        cursor = self._register_cursor
+
         # The operand
-        sub_operand = node.args[0]
+        sub_kind, sub_operand = args
 
-        # We do different things depending on the type of argument
-        if type(sub_operand) == IntegerLiteral:
+        # We do different things depending on the kind of argument
+        if sub_kind == ARG_INT:
             # We simply subtract to acc
-            self.accs[self._register_cursor] -= sub_operand.value
+            accs[cursor] = clamp_value(accs[cursor] - sub_operand)
 
-        elif type(sub_operand) == PortLiteral:
+        elif sub_kind == ARG_PORT:
             # We handle port transfers
-            sub_operand_value = self.get_value_from_port(sub_operand.name)
+            sub_operand_value = self.get_value_from_port(sub_operand)
 
             # We check if we got a value from the port
             if sub_operand_value is None:
                 return
 
             # We subtract the value
-            self.accs[self._register_cursor] -= sub_operand_value
+            accs[cursor] = clamp_value(accs[cursor] - sub_operand_value)
 
-        elif type(sub_operand) == RegisterLiteral:
+        elif sub_kind == ARG_REG:
             # This means we set acc to 0
-            self.accs[self._register_cursor] = 0
+            accs[cursor] = 0
 
         # We successfully executed the instruction
         return True
 
-    def instr_sav(self, node: NArgumentInstruction):
+    def instr_sav(self, args: tuple):
         """Saves acc into bak."""
-        self.baks[self._register_cursor] = self.accs[self._register_cursor]
+        cursor = self._register_cursor
+        self.baks[cursor] = self.accs[cursor]
         return True
 
-    def instr_swt(self, node: NArgumentInstruction):
+    def instr_swt(self, args: tuple):
         """Switches to the specified pair of registers (acc and bak)."""
 
         # The operand
-        swt_operand = node.args[0]
+        swt_kind, swt_operand = args
 
-        # We do different things depending on the type of argument
-        if type(swt_operand) == IntegerLiteral:
+        # We do different things depending on the kind of argument
+        if swt_kind == ARG_INT:
 
-            # We simply switch to the registers specified by the integer value
-            swt_operand_value = swt_operand.value
+            # We simply switch to the registers specified by the integer value, its range was checked when compiling
+            self._register_cursor = swt_operand
+            return True
 
-        elif type(swt_operand) == PortLiteral:
+        elif swt_kind == ARG_PORT:
             # We handle port transfers
-            swt_operand_value = self.get_value_from_port(swt_operand.name)
+            swt_operand_value = self.get_value_from_port(swt_operand)
 
             # We check if we got a value from the port
-            if swt_operand is None:
+            if swt_operand_value is None:
                 return
 
         else:
-            # This means the operand is a RegisterLiteral, we can guarantee this because of the validator
+            # This means the operand is a register, we can guarantee this because of the validator
             # This means we switch to the pair pointed to by the previous acc
             swt_operand_value = self.accs[self._register_cursor]
 
         # We sanity check the value, we only allow positive valid indices
-        if not (len(self.accs) > swt_operand_value >= 0):
-            raise TISSyntaxError(
-                "SWT operand was not in the valid range of registers. Range is {0}-{1} inclusive, operand was {2}."
-                    .format(0, len(self.accs), swt_operand_value))
+        if not (REGISTER_PAIRS > swt_operand_value >= 0):
+            raise swt_range_error(swt_operand_value)
 
         # We switch to the pair
         self._register_cursor = swt_operand_value
@@ -426,16 +496,24 @@ class TISNode(object):
         # We successfully executed the instruction
         return True
 
-    def instr_swp(self, node: NArgumentInstruction):
+    def instr_swp(self, args: tuple):
         """Swaps the current acc with the current bak, does not swap all register."""
-        # We simply swap them using python's implicit tuple syntax
-        self.accs[self._register_cursor], self.baks[self._register_cursor] = self.baks[self._register_cursor], self.accs[self._register_cursor]
+        # We bind the registers and the cursor to locals, since we use them more than once
+        accs = self.accs
+        baks = self.baks
+        cursor = self._register_cursor
+        # We swap them through a temporary, which doesn't need a tuple like python's implicit tuple syntax does
+        acc = accs[cursor]
+        accs[cursor] = baks[cursor]
+        baks[cursor] = acc
         return True
 
-    def instr_neg(self, node: NArgumentInstruction):
+    def instr_neg(self, args: tuple):
         """Negates acc."""
-        # We negate it
-        self.accs[self._register_cursor] *= -1
+        # We negate it, binding the registers and the cursor to locals since we read and write acc
+        accs = self.accs
+        cursor = self._register_cursor
+        accs[cursor] = -accs[cursor]
         return True
 
     @staticmethod
@@ -443,80 +521,124 @@ class TISNode(object):
         """Does nothing, simply takes one step."""
         return True
 
-    def instr_jmp(self, node: NArgumentInstruction):
+    def instr_jmp(self, args: tuple):
         """Unconditionally jumps to a label."""
 
-        # We change the instruction pointer to the index that the label table lookup gives
-        # The validator has checked that the label exists,
-        # and that implies that the populating of the label table has created a valid table
-        self.instruction_pointer = self.label_table[node.args[0].name]
+        # We change the instruction pointer to the instruction before the label target, which was looked up in the label table when compiling,
+        # since we increment the instruction pointer after each successful instruction execution
+        self.instruction_pointer = args[1] - 1
 
         # We successfully executed the instruction
         return True
 
-    def instr_jez(self, node: NArgumentInstruction):
+    def instr_jez(self, args: tuple):
         """Jumps to label if acc is 0."""
 
-        # If acc is 0, we execute a jmp instruction with the label given,
+        # If acc is 0, we jump to the label the same way instr_jmp does,
         # else, continues execution by returning True
-        if self.accs[self._register_cursor] is 0:
-            return self.instr_jmp(NArgumentInstruction("jmp", [node.args[0]]))
+        if self.accs[self._register_cursor] == 0:
+            self.instruction_pointer = args[1] - 1
         return True
 
-    def instr_jnz(self, node: NArgumentInstruction):
+    def instr_jnz(self, args: tuple):
         """Jumps to label if acc is not 0."""
 
-        # If acc is not 0, we execute a jmp instruction with the label given,
+        # If acc is not 0, we jump to the label the same way instr_jmp does,
         # else, continues execution by returning True
-        if self.accs[self._register_cursor] is not 0:
-            return self.instr_jmp(NArgumentInstruction("jmp", [node.args[0]]))
+        if self.accs[self._register_cursor] != 0:
+            self.instruction_pointer = args[1] - 1
         return True
 
-    def instr_jgz(self, node: NArgumentInstruction):
+    def instr_jgz(self, args: tuple):
         """Jumps to label if acc is greater than 0."""
 
-        # If acc is greater than 0, we execute a jmp instruction with the label given,
+        # If acc is greater than 0, we jump to the label the same way instr_jmp does,
         # else, continues execution by returning True
         if self.accs[self._register_cursor] > 0:
-            return self.instr_jmp(NArgumentInstruction("jmp", [node.args[0]]))
+            self.instruction_pointer = args[1] - 1
         return True
 
-    def instr_jlz(self, node: NArgumentInstruction):
+    def instr_jlz(self, args: tuple):
         """Jumps to label if acc is less than 0."""
 
-        # If acc is less than 0, we execute a jmp instruction with the label given,
+        # If acc is less than 0, we jump to the label the same way instr_jmp does,
         # else, continues execution by returning True
         if self.accs[self._register_cursor] < 0:
-            return self.instr_jmp(NArgumentInstruction("jmp", [node.args[0]]))
+            self.instruction_pointer = args[1] - 1
         return True
 
-    def instr_jro(self, node: NArgumentInstruction):
+    def instr_jro(self, args: tuple):
         """Jumps operand instructions forwards."""
 
         # The operand
-        jro_operand = node.args[0]
+        jro_kind, jro_operand = args
 
-        # We do different things depending on the type of argument
-        if type(jro_operand) == IntegerLiteral:
+        # We do different things depending on the kind of argument
+        if jro_kind == ARG_INT:
             # We get the integer value
-            jro_operand_value = jro_operand.value
+            jro_operand_value = jro_operand
 
-        elif type(jro_operand) == PortLiteral:
+        elif jro_kind == ARG_PORT:
             # We handle port transfers
-            jro_operand_value = self.get_value_from_port(jro_operand.name)
+            jro_operand_value = self.get_value_from_port(jro_operand)
 
             # We check if we got a value from the port
             if jro_operand_value is None:
                 return
 
         else:
-            # Since we execute validated code, we know that the operand is a RegisterLiteral
+            # Since we execute validated code, we know that the operand is a register
             # We get the register value
             jro_operand_value = self.accs[self._register_cursor]
 
-        # We use the ast-lookup dict that only counts instructions, as that's what the game does
-        # We subtract the operand value because we increment the instruction counter after each successful instruction execution
-        self.instruction_pointer = self.ast_instr_real_lookup[self.ast_real_instr_lookup[self.instruction_pointer] + jro_operand_value - 1]
+        # The executable ast only has instructions, so we can jump by offsetting the instruction pointer, wrapping around the ast
+        # We subtract one because we increment the instruction counter after each successful instruction execution
+        self.instruction_pointer = (self.instruction_pointer + jro_operand_value) % self.ast_len - 1
 
         # We successfully executed the instruction
-        return True
\ No newline at end of file
+        return True
+
+# The instruction functions of TISNode indexed by opcode, these are called with the node and the compiled arguments.
+# Opcodes without an instruction function have None
+_OP_DISPATCH = (
+    TISNode.instr_mov,
+    TISNode.instr_nop,
+    TISNode.instr_swp,
+    TISNode.instr_swt,
+    TISNode.instr_sav,
+    TISNode.instr_add,
+    TISNode.instr_sub,
+    TISNode.instr_neg,
+    TISNode.instr_jmp,
+    TISNode.instr_jez,
+    TISNode.instr_jnz,
+    TISNode.instr_jgz,
+    TISNode.instr_jlz,
+    TISNode.instr_jro,
+    None
+)
+
+
+def compile_machine(machine: dict):
+    """Binds and compiles all nodes in the machine, a dict of node ids to nodes, into a list of step functions for run_compiled.
+    The step functions read the nodes' state when they're called, so they can be kept and run for any number of batches."""
+    # We compile the nodes into step functions once, instead of interpreting their asts on every step
+    step_fns = []
+    for tis_node in machine.values():
+        tis_node.bind_nodes(machine)
+        step_fns.append(compile_node(tis_node))
+    return step_fns
+
+
+def run_compiled(step_fns: list, steps: int):
+    """Steps all nodes the given number of times with the step functions from compile_machine."""
+    for _ in range(steps):
+        for step in step_fns:
+            step()
+
+
+def step_machine(machine: dict, steps: int):
+    """Steps all nodes in the machine, a dict of node ids to nodes, the given number of times.
+    This is for running a batch of steps without looking at the nodes in between,
+    for several batches compile the machine once with compile_machine and run it with run_compiled."""
+    run_compiled(compile_machine(machine), steps)